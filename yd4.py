@@ -1,42 +1,45 @@
 import sys
 import os
 import asyncio
-import json
-import argparse
+import collections
+import contextlib
+import gzip
+import hashlib
+import importlib.util
+import multiprocessing
+import queue
+import secrets
+import shutil
+import struct
 import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 from typing import Callable, Optional, Tuple
 from pathlib import Path
 
-# --- Dependency Check and Imports ---
-try:
-    import yt_dlp
-except ImportError:
-    print("FATAL ERROR: yt-dlp is not installed. Please run: pip install yt-dlp")
-    sys.exit(1)
-
-# Only import Textual/FastAPI components if they are available
-TEXTUAL_OK = True
-try:
-    from textual.app import App, ComposeResult
-    from textual.containers import Container
-    from textual.widgets import Header, Footer, Input, Button, Static, ProgressBar, RadioSet, RadioButton, Log
-    from textual.worker import Worker, WorkerState
-except ImportError:
-    TEXTUAL_OK = False
-
-FASTAPI_OK = True
-try:
-    from fastapi import FastAPI, WebSocket, Request
-    from fastapi.responses import HTMLResponse
-    import uvicorn
-except ImportError:
-    FASTAPI_OK = False
+# --- Dependency Check ---
+# yt-dlp, Textual and FastAPI/uvicorn are heavy to import, so they are only
+# imported by the code path that needs them (see run_tui_app/run_web_app).
+
+# aria2c is optional: when present, yt-dlp hands the byte transfer to it
+ARIA2C_PATH = shutil.which("aria2c")
+# Reserve the whole file up front so aria2c writes each piece at its offset.
+# Android/Termux shared storage cannot fallocate, and other platforms' builds
+# may lack it, so only regular Linux uses it.
+if sys.platform.startswith("linux") and not os.path.exists("/data/data/com.termux"):
+    ARIA2C_FILE_ALLOCATION = "falloc"
+else:
+    ARIA2C_FILE_ALLOCATION = "none"
 
 # ==========================================
 # PLATFORM-SPECIFIC DEFAULT PATHS
 # ==========================================
+@lru_cache(maxsize=1)
 def get_default_download_path() -> str:
-    """Get platform-specific default download path."""
+    """Get platform-specific default download path (computed once per process)."""
     system = sys.platform
     
     if system == "win32":
@@ -71,31 +74,147 @@ def get_default_download_path() -> str:
 # ==========================================
 # 1. CORE DOWNLOADER ENGINE (Enhanced)
 # ==========================================
+# Number of parallel fragment/range requests per download
+DEFAULT_CONCURRENCY = 8
+# Range request size for chunked HTTP downloads
+HTTP_CHUNK_SIZE = 10 * 1024 * 1024
+# Seconds between reads of aria2c's control file (see _Aria2cProgress)
+ARIA2C_POLL_INTERVAL = 0.5
+
+
+def _read_aria2_control_file(path: str) -> Optional[Tuple[int, int]]:
+    """Returns (completed_bytes, total_bytes) from an aria2 control file, or None.
+
+    Layout (version 1, big-endian): version u16, extension u32, info hash
+    length u32 + hash, piece length u32, total length u64, upload length u64,
+    bitfield length u32 + bitfield of finished pieces.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        version, _extension, hash_length = struct.unpack_from('>HII', data, 0)
+        if version != 1:
+            return None
+        piece_length, total, _uploaded, bitfield_length = struct.unpack_from('>IQQI', data, 10 + hash_length)
+    except (OSError, struct.error):
+        return None
+    start = 10 + hash_length + 24
+    bitfield = data[start:start + bitfield_length]
+    if not total or len(bitfield) != bitfield_length:
+        return None
+    completed = sum(bin(byte).count('1') for byte in bitfield) * piece_length
+    return min(completed, total), total
+
+
+def _make_before_download_pp(hook: Callable):
+    """A before_dl postprocessor that sets up the transfer of the selected format(s).
+
+    A chunk size the extractor chose is kept (YouTube throttles larger
+    requests). Otherwise a single progressive file is fetched with one plain
+    GET and other HTTP streams in HTTP_CHUNK_SIZE range requests; yt-dlp's
+    HTTP downloader reads the size from each format's downloader_options.
+    Then {'status': 'started', 'filename': ...} is sent to hook.
+    """
+    from yt_dlp.postprocessor import PostProcessor
+
+    class BeforeDownloadPP(PostProcessor):
+        def run(self, info):
+            if DownloaderEngine._is_single_stream(info):
+                info['downloader_options'] = {'http_chunk_size': 0, **info.get('downloader_options', {})}
+            else:
+                for f in info.get('requested_formats') or [info]:
+                    f['downloader_options'] = {'http_chunk_size': HTTP_CHUNK_SIZE, **f.get('downloader_options', {})}
+            hook({'status': 'started', 'filename': info['_filename']})
+            return [], info
+
+    return BeforeDownloadPP()
+
+
+class _Aria2cProgress:
+    """Reports aria2c's progress to a yt-dlp progress hook.
+
+    yt-dlp does not read aria2c's output and only calls the hooks once the
+    file is finished. For a single HTTP(S) file aria2c keeps a control file
+    (<file>.part.aria2) beside the download, so a background thread polls it
+    while the transfer runs. Fragmented (HLS/DASH) downloads are not covered,
+    which is why _base_opts only hands plain HTTP(S) to aria2c.
+    """
+
+    def __init__(self, hook: Callable):
+        self._hook = hook
+        self._prefix = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def watch(self, filename: str):
+        """Follows the download(s) that will end up as filename."""
+        # Separate video/audio streams are written as <stem>.f<id>.<ext>.part
+        self._prefix = os.path.splitext(filename)[0] + '.'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        reported = None
+        while not self._stop.wait(ARIA2C_POLL_INTERVAL):
+            if self._prefix is None:
+                continue
+            directory, stem = os.path.split(self._prefix)
+            try:
+                with os.scandir(directory) as it:
+                    paths = [entry.path for entry in it
+                             if entry.name.startswith(stem) and entry.name.endswith('.part.aria2')]
+            except OSError:
+                continue
+            for path in paths:
+                progress = _read_aria2_control_file(path)
+                if progress and progress != reported:
+                    reported = progress
+                    self._hook({'status': 'downloading', 'filename': path[:-len('.aria2')],
+                                'downloaded_bytes': progress[0], 'total_bytes': progress[1]})
+
 class DownloaderEngine:
     """Handles the core download logic using yt-dlp and manages file paths."""
 
-    def download(self, url: str, fmt: str, output_path: str, hook_callback: Optional[Callable] = None) -> Tuple[bool, str]:
-        # Set default path if none is provided
-        if not output_path or not output_path.strip():
-            output_path = get_default_download_path()
-        
-        # Normalize path
-        output_path = os.path.abspath(output_path)
-        
-        # Ensure the directory exists
-        try:
-            os.makedirs(output_path, exist_ok=True)
-        except Exception as e:
-            return False, f"Failed to create directory: {str(e)}"
-            
+    def __init__(self):
+        # One reusable YoutubeDL per format, created on first use
+        self._ydls = {}
+        self._ydl_lock = threading.Lock()
+        self._hook = None
+        self._last_path = None
+
+    @staticmethod
+    def _base_opts(fmt: str) -> dict:
+        """Options shared by every download of the given format."""
         ydl_opts = {
-            'outtmpl': os.path.join(output_path, '%(title)s.%(ext)s'),
+            'outtmpl': '%(title)s.%(ext)s',
             'quiet': True,
             'nocolor': True,
             'noplaylist': True,
+            'extract_flat': 'discard_in_playlist',
             'no_warnings': True,
+            # Keep yt-dlp's and aria2c's console progress off the TUI
+            'noprogress': True,
+            # Range request size is chosen per format (see _make_before_download_pp)
+            'retries': 10,
+            'fragment_retries': 10,
+            # Stream fragments straight into the output file
+            'keep_fragments': False,
+            'hls_use_mpegts': False,
         }
 
+        if ARIA2C_PATH:
+            # Multi-connection transfer in aria2c for plain HTTP(S) files (the
+            # 'http' key also covers https), whose progress _Aria2cProgress
+            # reads. HLS/DASH fragments stay with yt-dlp's native downloader,
+            # which reports progress and honours concurrent_fragment_downloads.
+            ydl_opts['external_downloader'] = {'default': 'native', 'http': 'aria2c'}
+
         if fmt == 'audio':
             ydl_opts.update({
                 'format': 'bestaudio/best',
@@ -107,11 +226,99 @@ class DownloaderEngine:
             })
         else:
             ydl_opts.update({'format': 'bestvideo+bestaudio/best'})
+        return ydl_opts
+
+    def _dispatch_hook(self, d):
+        if self._hook:
+            self._hook(d)
+
+    @contextlib.contextmanager
+    def _youtube_dl(self, fmt: str, params: dict, hook: Callable):
+        """Yields a YoutubeDL set up with params and hook for one download.
+
+        The cached instance for fmt is reused when it is free. YoutubeDL is not
+        thread-safe, so a call made while another download runs gets a fresh one.
+        """
+        import yt_dlp
+
+        def new_ydl(opts, hook):
+            ydl = yt_dlp.YoutubeDL({**opts, 'progress_hooks': [hook]})
+            ydl.add_post_processor(_make_before_download_pp(hook), when='before_dl')
+            return ydl
+
+        if not self._ydl_lock.acquire(blocking=False):
+            with new_ydl({**self._base_opts(fmt), **params}, hook) as ydl:
+                yield ydl
+            return
+
+        try:
+            ydl = self._ydls.get(fmt)
+            if ydl is None:
+                ydl = new_ydl(self._base_opts(fmt), self._dispatch_hook)
+                self._ydls[fmt] = ydl
+            ydl.params.update(params)
+            self._hook = hook
+            yield ydl
+        finally:
+            self._hook = None
+            self._ydl_lock.release()
+
+    @staticmethod
+    def _is_single_stream(info: dict) -> bool:
+        """True when the selected format is one progressive HTTP file (no merge, no fragments)."""
+        return not info.get('requested_formats') and info.get('protocol') in ('http', 'https')
+
+    @staticmethod
+    def _find_by_title(output_path: str, title: str) -> Optional[str]:
+        """Fallback lookup: first finished file in output_path named <title>.<ext>.
+
+        The title is sanitized the way yt-dlp does for the output template.
+        """
+        from yt_dlp.utils import sanitize_filename
+
+        stem = sanitize_filename(title) + '.'
+        with os.scandir(output_path) as it:
+            return next((entry.path for entry in it
+                         if entry.name.startswith(stem) and not entry.name.endswith(('.part', '.aria2', '.ytdl'))
+                         and entry.is_file()), None)
+
+    def download(self, url: str, fmt: str, output_path: str, hook_callback: Optional[Callable] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY) -> Tuple[bool, str]:
+        # Set default path if none is provided
+        if not output_path or not output_path.strip():
+            output_path = get_default_download_path()
+        
+        # Normalize path
+        output_path = os.path.abspath(output_path)
+        
+        # Ensure the directory exists (checked again only when the path changes)
+        if output_path != self._last_path:
+            try:
+                os.makedirs(output_path, exist_ok=True)
+            except Exception as e:
+                return False, f"Failed to create directory: {str(e)}"
+            self._last_path = output_path
+            
+        # Per-call settings applied on top of _base_opts
+        connections = str(max(1, min(concurrency, 16)))
+        params = {
+            'paths': {'home': output_path},
+            'concurrent_fragment_downloads': concurrency,
+            'external_downloader_args': {
+                'aria2c': ['-x', connections, '-s', connections, '-k', '1M',
+                           f'--file-allocation={ARIA2C_FILE_ALLOCATION}',
+                           # Refresh the control file _Aria2cProgress reads
+                           '--auto-save-interval=1'],
+            },
+        }
 
         downloaded_file = None
         
         def internal_hook(d):
             nonlocal downloaded_file
+            if d['status'] == 'started':
+                aria2c_progress.watch(d['filename'])
+                return
             if d['status'] == 'finished':
                 # Capture the downloaded filename
                 downloaded_file = d.get('filename')
@@ -122,10 +329,11 @@ class DownloaderEngine:
                 except Exception:
                     pass
 
-        ydl_opts['progress_hooks'] = [internal_hook]
-        
+        aria2c_progress = _Aria2cProgress(internal_hook)
+
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with aria2c_progress if ARIA2C_PATH else contextlib.nullcontext(), \
+                    self._youtube_dl(fmt, params, internal_hook) as ydl:
                 info = ydl.extract_info(url, download=True)
                 
                 # Get the final filename after all post-processing
@@ -138,22 +346,22 @@ class DownloaderEngine:
                     else:
                         final_file = ydl.prepare_filename(info)
                     
-                    # Verify file exists
-                    if os.path.exists(final_file):
+                    # prepare_filename is right in the common case; only scan on a miss
+                    try:
+                        os.stat(final_file)
                         return True, final_file
-                    elif downloaded_file and os.path.exists(downloaded_file):
-                        return True, downloaded_file
-                    else:
-                        # Search for the file in the output directory
+                    except FileNotFoundError:
+                        pass
+
+                    if not (downloaded_file and os.path.exists(downloaded_file)):
+                        downloaded_file = None
                         if info.get('title'):
-                            title = info['title']
-                            # Try to find file with this title
-                            for file in os.listdir(output_path):
-                                if title in file:
-                                    found_path = os.path.join(output_path, file)
-                                    return True, found_path
-                        
-                        return False, f"Download completed but file not found in {output_path}"
+                            # Search for the file in the output directory
+                            downloaded_file = self._find_by_title(output_path, info['title'])
+                    if downloaded_file:
+                        return True, downloaded_file
+
+                    return False, f"Download completed but file not found in {output_path}"
                 else:
                     return False, "Failed to extract video information"
 
@@ -182,11 +390,15 @@ def open_file_in_os(file_path: str) -> bool:
 # ==========================================
 # 3. TERMINAL USER INTERFACE (TUI) MODE
 # ==========================================
-def run_tui_app():
-    if not TEXTUAL_OK:
+def run_tui_app(concurrency: int = DEFAULT_CONCURRENCY):
+    try:
+        from textual.app import App, ComposeResult
+        from textual.containers import Container
+        from textual.widgets import Header, Footer, Input, Button, Static, ProgressBar, RadioSet, RadioButton, Log
+    except ImportError:
         print("ERROR: Textual dependencies are missing. Run: pip install textual")
         sys.exit(1)
-        
+
     class YDDL_TUI(App):
         CSS = """
         Screen {
@@ -252,6 +464,7 @@ def run_tui_app():
 
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
+            self.engine = DownloaderEngine()
             self.last_downloaded_file = None
             self.is_downloading = False
 
@@ -273,6 +486,13 @@ def run_tui_app():
             )
             yield Footer()
 
+        async def on_mount(self) -> None:
+            # Cache widgets touched on every progress tick to avoid DOM queries
+            self._bar = self.query_one("#bar", ProgressBar)
+            self._log = self.query_one("#log", Log)
+            self._start_btn = self.query_one("#start", Button)
+            self._open_btn = self.query_one("#open", Button)
+
         async def on_button_pressed(self, event: Button.Pressed):
             if event.button.id == "start":
                 if self.is_downloading:
@@ -283,14 +503,14 @@ def run_tui_app():
                 fmt = "audio" if self.query_one("#aud", RadioButton).value else "video"
                 
                 if not url:
-                    self.query_one("#log", Log).write_line("Error: No URL provided.")
+                    self._log.write_line("Error: No URL provided.")
                     return
 
                 output_dir = path if path else get_default_download_path()
-                self.query_one("#log", Log).write_line(f"Starting {fmt} download...")
-                self.query_one("#log", Log).write_line(f"Output directory: {output_dir}")
-                self.query_one("#start", Button).disabled = True
-                self.query_one("#open", Button).disabled = True
+                self._log.write_line(f"Starting {fmt} download...")
+                self._log.write_line(f"Output directory: {output_dir}")
+                self._start_btn.disabled = True
+                self._open_btn.disabled = True
                 self.is_downloading = True
 
                 # Pass a lambda that calls download_task - this ensures it runs in worker thread
@@ -301,53 +521,55 @@ def run_tui_app():
 
         def download_task(self, url: str, fmt: str, path: str):
             """This runs in a worker thread."""
-            engine = DownloaderEngine()
+            last_percent = -1.0
 
             def progress_hook(d):
+                nonlocal last_percent
                 if d['status'] == 'downloading':
-                    try:
-                        percent_str = d.get('_percent_str', '0%').replace('%', '').strip()
-                        percent = float(percent_str)
+                    downloaded = d.get('downloaded_bytes')
+                    total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                    if total and downloaded is not None:
+                        percent = downloaded * 100.0 / total
+                        # Skip sub-half-percent moves to save thread hops
+                        if abs(percent - last_percent) < 0.5:
+                            return
+                        last_percent = percent
                         self.call_from_thread(self.update_progress, percent)
-                    except (ValueError, TypeError):
-                        pass
                 elif d['status'] == 'finished':
-                    self.call_from_thread(self.query_one("#log", Log).write_line, "Download complete. Processing...")
+                    self.call_from_thread(self._log.write_line, "Download complete. Processing...")
 
-            success, result = engine.download(url, fmt, path, progress_hook)
+            success, result = self.engine.download(url, fmt, path, progress_hook, concurrency)
             self.call_from_thread(self.finish_ui, success, result)
 
         def update_progress(self, percent: float):
             """Called from worker thread via call_from_thread."""
             try:
-                self.query_one("#bar", ProgressBar).update(progress=percent)
+                self._bar.update(progress=percent)
             except Exception:
                 pass
 
         def finish_ui(self, success: bool, result: str):
             """Called from worker thread via call_from_thread."""
-            log = self.query_one("#log", Log)
-            
             if success:
                 self.last_downloaded_file = result
-                log.write_line(f"SUCCESS: Saved to {self.last_downloaded_file}")
-                self.query_one("#open", Button).disabled = False
+                self._log.write_line(f"SUCCESS: Saved to {self.last_downloaded_file}")
+                self._open_btn.disabled = False
             else:
                 self.last_downloaded_file = None
-                log.write_line(f"ERROR: {result}")
+                self._log.write_line(f"ERROR: {result}")
             
-            self.query_one("#start", Button).disabled = False
-            self.query_one("#bar", ProgressBar).update(progress=0)
+            self._start_btn.disabled = False
+            self._bar.update(progress=0)
             self.is_downloading = False
 
         def action_open_last_file(self):
             """Action bound to 'o' key and 'Open' button."""
             if self.last_downloaded_file and os.path.exists(self.last_downloaded_file):
-                self.query_one("#log", Log).write_line(f"Opening: {self.last_downloaded_file}")
+                self._log.write_line(f"Opening: {self.last_downloaded_file}")
                 if not open_file_in_os(self.last_downloaded_file):
-                    self.query_one("#log", Log).write_line("Failed to open file automatically.")
+                    self._log.write_line("Failed to open file automatically.")
             else:
-                self.query_one("#log", Log).write_line("Error: No file available to open.")
+                self._log.write_line("Error: No file available to open.")
 
     YDDL_TUI().run()
 
@@ -438,6 +660,12 @@ HTML_TEMPLATE = """
             font-size: 0.9em; 
             color: #aaa;
         }
+        #fileLink { 
+            display: none; 
+            text-align: center; 
+            margin-top: 10px; 
+            color: var(--main); 
+        }
     </style>
 </head>
 <body>
@@ -454,21 +682,41 @@ HTML_TEMPLATE = """
         <div id="progress-area">
             <div class="progress-bar"><div class="fill" id="fill"></div></div>
             <div id="status">Ready</div>
+            <a id="fileLink" download>Save file to this device</a>
         </div>
     </div>
 
     <script>
+        // Elements used on every message, looked up once
+        const $fill = document.getElementById('fill'),
+              $status = document.getElementById('status'),
+              $btn = document.getElementById('downloadBtn'),
+              $path = document.getElementById('pathInfo'),
+              $link = document.getElementById('fileLink');
+
         // Get default path from server
         fetch('/info')
             .then(r => r.json())
             .then(data => {
-                document.getElementById('pathInfo').innerText = 'Files saved to: ' + data.default_path;
+                $path.textContent = 'Files saved to: ' + data.default_path;
             })
             .catch(() => {
-                document.getElementById('pathInfo').innerText = 'Files saved to default location';
+                $path.textContent = 'Files saved to default location';
             });
 
         let ws;
+        const encoder = new TextEncoder();
+        const decoder = new TextDecoder();
+        // Progress frames are coalesced: only the newest is drawn per animation frame
+        let pendingProgress = null;
+        function renderProgress() {
+            const data = pendingProgress;
+            pendingProgress = null;
+            if (!data) return;
+            $fill.style.width = data.percent + '%';
+            $status.textContent = `${data.status} | ${Math.round(data.percent)}%`;
+        }
+
         function startDownload() {
             const url = document.getElementById('url').value.trim();
             const fmt = document.querySelector('input[name="fmt"]:checked').value;
@@ -478,135 +726,383 @@ HTML_TEMPLATE = """
             }
 
             document.getElementById('progress-area').style.display = 'block';
-            document.getElementById('status').innerText = "Connecting...";
-            document.getElementById('downloadBtn').disabled = true;
-            document.getElementById('fill').style.width = '0%';
+            $status.textContent = "Connecting...";
+            $btn.disabled = true;
+            $fill.style.width = '0%';
+            $link.style.display = 'none';
 
             const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
             ws = new WebSocket(`${protocol}://${window.location.host}/ws`);
+            // Server frames are orjson-encoded binary messages
+            ws.binaryType = 'arraybuffer';
 
             ws.onopen = () => {
-                ws.send(JSON.stringify({url: url, format: fmt}));
-                document.getElementById('status').innerText = 'Download started...';
+                // Sent as a binary frame so the server can skip text decoding
+                ws.send(encoder.encode(JSON.stringify({url: url, format: fmt})));
+                $status.textContent = 'Download started...';
             };
 
             ws.onmessage = (event) => {
-                const data = JSON.parse(event.data);
+                const data = JSON.parse(decoder.decode(event.data));
                 if(data.type === 'progress') {
-                    document.getElementById('fill').style.width = data.percent + '%';
-                    document.getElementById('status').innerText = `${data.status} | ${Math.round(data.percent)}%`;
-                } else if (data.type === 'done') {
-                    document.getElementById('status').innerText = "Download COMPLETE! File saved to: " + data.path;
-                    document.getElementById('fill').style.width = "100%";
-                    document.getElementById('downloadBtn').disabled = false;
+                    if (!pendingProgress) requestAnimationFrame(renderProgress);
+                    pendingProgress = data;
+                    return;
+                }
+                pendingProgress = null;
+                if (data.type === 'done') {
+                    $status.textContent = "Download COMPLETE! File saved to: " + data.path;
+                    $fill.style.width = "100%";
+                    $link.href = data.url;
+                    $link.style.display = 'block';
+                    $btn.disabled = false;
                 } else if (data.type === 'error') {
-                    document.getElementById('status').innerText = "ERROR: " + data.msg;
-                    document.getElementById('downloadBtn').disabled = false;
+                    $status.textContent = "ERROR: " + data.msg;
+                    $btn.disabled = false;
                 }
             };
             
             ws.onerror = () => {
-                document.getElementById('status').innerText = "Connection error occurred.";
-                document.getElementById('downloadBtn').disabled = false;
+                $status.textContent = "Connection error occurred.";
+                $btn.disabled = false;
             };
             
             ws.onclose = () => {
                 console.log("WebSocket closed.");
-                document.getElementById('downloadBtn').disabled = false;
+                $btn.disabled = false;
             };
         }
     </script>
 </body>
 </html>
 """
-def run_web_app():
-    if not FASTAPI_OK:
-        print("ERROR: FastAPI dependencies are missing. Run: pip install fastapi uvicorn")
+
+def _minify_html(html: str) -> str:
+    """Drops indentation, blank lines and whole-line // comments.
+
+    Line breaks are kept so the inline JavaScript keeps its statement
+    boundaries.
+    """
+    lines = (line.strip() for line in html.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+HTML_TEMPLATE = _minify_html(HTML_TEMPLATE)
+
+# Encoded once so the index route serves static bytes with an ETag; "/"
+# never changes its URL, so browsers revalidate it (a 304 while unchanged)
+_HTML_BYTES = HTML_TEMPLATE.encode("utf-8")
+_HTML_ETAG = '"' + hashlib.sha1(_HTML_BYTES, usedforsecurity=False).hexdigest() + '"'
+_HTML_HEADERS = {"ETag": _HTML_ETAG, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+# Seconds a finished file stays available under /download/{token}
+DOWNLOAD_LINK_TTL = 3600
+
+# One engine per download worker (process, or thread in the fallback pool)
+_worker_engine = None
+
+def _worker_main(url: str, fmt: str, path: str, concurrency: int, progress_queue) -> Tuple[bool, str]:
+    """Runs a download in the web server's download pool.
+
+    Progress payloads are put on progress_queue as orjson-encoded bytes and
+    None marks the end, so the hook never has to cross back into the
+    server's event loop and the loop never encodes progress frames.
+    """
+    import orjson
+
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = DownloaderEngine()
+
+    finished_frame = orjson.dumps({"type": "progress", "percent": 100, "status": "Processing..."})
+    last_percent = -1.0
+    last_sent = 0.0
+
+    def web_hook(d):
+        nonlocal last_percent, last_sent
+        if d['status'] == 'downloading':
+            downloaded = d.get('downloaded_bytes')
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if total and downloaded is not None:
+                percent = downloaded * 100.0 / total
+                moved = abs(percent - last_percent)
+                now = time.monotonic()
+                # Within 100 ms of the last frame only a jump of >= 1% gets through
+                if moved < 0.5 or (now - last_sent < 0.1 and moved < 1.0):
+                    return
+                last_percent = percent
+                last_sent = now
+                progress_queue.put(orjson.dumps({"type": "progress", "percent": percent, "status": "Downloading..."}))
+        elif d['status'] == 'finished':
+            progress_queue.put(finished_frame)
+
+    try:
+        return _worker_engine.download(url, fmt, path, web_hook, concurrency)
+    finally:
+        progress_queue.put(None)
+
+def run_web_app(concurrency: int = DEFAULT_CONCURRENCY):
+    try:
+        from fastapi import FastAPI, HTTPException, WebSocket, Request
+        from fastapi.responses import FileResponse, Response
+        from starlette.websockets import WebSocketDisconnect, WebSocketState
+        import orjson
+        import uvicorn
+    except ImportError:
+        print("ERROR: FastAPI dependencies are missing. Run: pip install fastapi uvicorn websockets orjson 'uvloop>=0.19' httptools")
         sys.exit(1)
 
-    app = FastAPI()
-    engine = DownloaderEngine()
+    def send_message(ws, obj):
+        return ws.send_bytes(orjson.dumps(obj))
+
+    # Optional faster event loop (uvloop>=0.19, no Windows support) and HTTP parser
+    uvloop_ok = sys.platform != "win32" and importlib.util.find_spec("uvloop") is not None
+    httptools_ok = importlib.util.find_spec("httptools") is not None
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        # One keep-alive HTTP client shared by all requests for server-side
+        # fetches (thumbnails, metadata). httpx (and h2 for HTTP/2) is optional.
+        app.state.http = None
+        if importlib.util.find_spec("httpx") is not None:
+            import httpx
+            app.state.http = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            )
+        try:
+            yield
+        finally:
+            if app.state.http is not None:
+                await app.state.http.aclose()
+
+    app = FastAPI(lifespan=lifespan)
+
+    # Downloads run in separate processes so concurrent clients are not
+    # serialized on the GIL. Platforms without working process
+    # synchronization (e.g. Android/Termux lacks sem_open) use threads.
+    # Either way the pool is capped so many clients cannot oversubscribe
+    # the machine; extra downloads wait for a free slot.
+    download_slots = min(4, os.cpu_count() or 2)
+    try:
+        mp_context = multiprocessing.get_context("spawn")
+        download_pool = ProcessPoolExecutor(max_workers=download_slots, mp_context=mp_context)
+        manager = mp_context.Manager()
+        new_progress_queue = manager.Queue
+    except (ImportError, NotImplementedError, OSError):
+        download_pool = ThreadPoolExecutor(max_workers=download_slots, thread_name_prefix="ydl")
+        manager = None
+        new_progress_queue = queue.SimpleQueue
+
+    # Page compressed once up front, preferred encoding first; brotli is optional
+    html_variants = [("gzip", gzip.compress(_HTML_BYTES, compresslevel=9, mtime=0))]
+    if importlib.util.find_spec("brotli") is not None:
+        import brotli
+        html_variants.insert(0, ("br", brotli.compress(_HTML_BYTES, quality=11)))
+    html_variants = [
+        (encoding, body, {**_HTML_HEADERS, "ETag": f'{_HTML_ETAG[:-1]}-{encoding}"', "Content-Encoding": encoding})
+        for encoding, body in html_variants
+    ]
+
+    def accepted_encodings(header: str) -> set:
+        """Codings listed in an Accept-Encoding header, minus those refused with q=0."""
+        accepted = set()
+        for token in header.split(","):
+            coding, *params = (part.strip() for part in token.split(";"))
+            q = next((param[2:] for param in params if param[:2].lower() == "q="), "1")
+            try:
+                if float(q) > 0:
+                    accepted.add(coding.lower())
+            except ValueError:
+                pass
+        return accepted
 
-    @app.get("/", response_class=HTMLResponse)
-    async def get():
-        return HTML_TEMPLATE
+    @app.get("/")
+    async def get(request: Request):
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        body, headers = next(
+            ((body, headers) for encoding, body, headers in html_variants if encoding in accepted),
+            (_HTML_BYTES, _HTML_HEADERS),
+        )
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/html; charset=utf-8", headers=headers)
+
+    info_bytes = orjson.dumps({"default_path": get_default_download_path()})
 
     @app.get("/info")
     async def get_info():
-        return {"default_path": get_default_download_path()}
+        return Response(info_bytes, media_type="application/json", headers={"Cache-Control": "public, max-age=300"})
+
+    # Finished files offered to the browser: token -> (path, expiry)
+    download_links = {}
+
+    def register_download(file_path: str) -> str:
+        now = time.monotonic()
+        for token, (_, expires) in list(download_links.items()):
+            if expires < now:
+                del download_links[token]
+        token = secrets.token_urlsafe(16)
+        download_links[token] = (file_path, now + DOWNLOAD_LINK_TTL)
+        return token
+
+    @app.get("/download/{token}")
+    async def get_download(token: str):
+        entry = download_links.get(token)
+        if entry is None or entry[1] < time.monotonic() or not os.path.isfile(entry[0]):
+            raise HTTPException(status_code=404, detail="Download link expired or file missing")
+        # FileResponse streams the file from disk (zero-copy sendfile when the
+        # ASGI server offers it); the media type is guessed from the file name
+        return FileResponse(entry[0], filename=os.path.basename(entry[0]))
 
     @app.websocket("/ws")
     async def websocket_endpoint(websocket: WebSocket):
+        nonlocal download_pool
+        loop = asyncio.get_running_loop()
+        send_bytes = websocket.send_bytes
         await websocket.accept()
         try:
-            data = await websocket.receive_text()
-            req = json.loads(data)
+            # The page sends a binary frame, fed to orjson without a UTF-8
+            # decode; text frames from other clients are accepted as well
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            req = orjson.loads(message.get("bytes") or message.get("text") or b"")
             url = req.get('url', '').strip()
             fmt = req.get('format', 'video')
             
             if not url:
-                await websocket.send_json({"type": "error", "msg": "No URL provided"})
+                await send_message(websocket, {"type": "error", "msg": "No URL provided"})
                 return
             
             path = get_default_download_path()
-            loop = asyncio.get_event_loop()
 
-            def web_hook(d):
-                if d['status'] == 'downloading':
-                    try:
-                        percent_str = d.get('_percent_str', '0%').replace('%', '').strip()
-                        percent = float(percent_str)
-                        asyncio.run_coroutine_threadsafe(
-                            websocket.send_json({"type": "progress", "percent": percent, "status": "Downloading..."}),
-                            loop
-                        )
-                    except (ValueError, TypeError):
-                        pass
-                elif d['status'] == 'finished':
-                    asyncio.run_coroutine_threadsafe(
-                        websocket.send_json({"type": "progress", "percent": 100, "status": "Processing..."}),
-                        loop
-                    )
+            # Only the latest progress payload is kept (last value wins, the
+            # maxlen=1 deque drops the stale one); a single writer task sends
+            # it at most every 100 ms.
+            latest = collections.deque(maxlen=1)
+            wake = asyncio.Event()
+            closing = False
 
-            success, result = await loop.run_in_executor(
-                None, lambda: engine.download(url, fmt, path, web_hook)
-            )
+            def put_latest(payload):
+                """Runs on the event loop thread."""
+                latest.append(payload)
+                wake.set()
+
+            progress_queue = new_progress_queue()
+
+            def read_progress():
+                # One plain callback per payload: no Future or Task is created
+                call_soon_threadsafe = loop.call_soon_threadsafe
+                for payload in iter(progress_queue.get, None):
+                    call_soon_threadsafe(put_latest, payload)
+
+            async def drain():
+                while True:
+                    await wake.wait()
+                    wake.clear()
+                    stop = closing
+                    if latest:
+                        # Payloads arrive already encoded by the worker
+                        await send_bytes(latest.popleft())
+                    if stop:
+                        return
+                    await asyncio.sleep(0.1)
+
+            writer_task = asyncio.create_task(drain())
+            reader_task = asyncio.ensure_future(asyncio.to_thread(read_progress))
+            pool = download_pool
+            try:
+                success, result = await loop.run_in_executor(
+                    pool, _worker_main, url, fmt, path, concurrency, progress_queue
+                )
+            except BrokenProcessPool:
+                # A worker process died (killed, out of memory): the pool then
+                # rejects all work, so later downloads get a fresh one
+                if pool is download_pool:
+                    download_pool = ProcessPoolExecutor(max_workers=download_slots, mp_context=mp_context)
+                    pool.shutdown(wait=False, cancel_futures=True)
+                success, result = False, "The download process crashed. Please try again."
+            finally:
+                # Unblock the reader even if the worker died before its sentinel,
+                # then flush the last progress payload before the final message
+                progress_queue.put(None)
+                await reader_task
+                closing = True
+                wake.set()
+                await writer_task
 
             if success:
-                await websocket.send_json({"type": "done", "path": result})
+                token = register_download(result)
+                await send_message(websocket, {"type": "done", "path": result, "url": f"/download/{token}"})
             else:
-                await websocket.send_json({"type": "error", "msg": result})
+                await send_message(websocket, {"type": "error", "msg": result})
 
-        except json.JSONDecodeError:
-            await websocket.send_json({"type": "error", "msg": "Invalid request format"})
+        except WebSocketDisconnect:
+            # The browser went away (e.g. tab closed mid-download); there is
+            # no one left to report to
+            pass
+        except orjson.JSONDecodeError:
+            await send_message(websocket, {"type": "error", "msg": "Invalid request format"})
         except Exception as e:
-            await websocket.send_json({"type": "error", "msg": str(e)})
+            await send_message(websocket, {"type": "error", "msg": str(e)})
         finally:
-            try:
+            # A failed send marks only application_state as disconnected and
+            # a received disconnect only client_state, so check both
+            if (websocket.client_state != WebSocketState.DISCONNECTED
+                    and websocket.application_state != WebSocketState.DISCONNECTED):
                 await websocket.close()
-            except Exception:
-                pass
 
     print(f"📁 Default download location: {get_default_download_path()}")
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="error")
+    try:
+        # The WebSocket only carries small JSON control/progress frames:
+        # permessage-deflate costs more CPU than it saves, and a 4 KiB
+        # message cap keeps per-connection buffers small
+        uvicorn.run(app, host="0.0.0.0", port=8000, log_level="error",
+                    loop="uvloop" if uvloop_ok else "auto",
+                    http="httptools" if httptools_ok else "auto",
+                    ws="auto", ws_per_message_deflate=False,
+                    ws_max_size=4096, ws_ping_interval=20, ws_ping_timeout=20)
+    finally:
+        download_pool.shutdown(wait=False, cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
 
 # ==========================================
 # 5. MAIN ENTRY POINT
 # ==========================================
 def main():
-    parser = argparse.ArgumentParser(description="YD Downloader: Terminal and Web App")
-    parser.add_argument("--web", action="store_true", help="Launch Local Web Server Interface")
-    args = parser.parse_args()
+    # A bare `python yd4.py` (the common TUI launch) skips argparse entirely
+    if len(sys.argv) == 1:
+        web, concurrency = False, DEFAULT_CONCURRENCY
+    else:
+        import argparse
+
+        def positive_int(value: str) -> int:
+            number = int(value)
+            if number < 1:
+                raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+            return number
+
+        parser = argparse.ArgumentParser(description="YD Downloader: Terminal and Web App")
+        parser.add_argument("--web", action="store_true", help="Launch Local Web Server Interface")
+        parser.add_argument("--concurrency", type=positive_int, default=DEFAULT_CONCURRENCY, metavar="N",
+                            help=f"Parallel connections per download (default: {DEFAULT_CONCURRENCY})")
+        args = parser.parse_args()
+        web, concurrency = args.web, args.concurrency
+
+    if importlib.util.find_spec("yt_dlp") is None:
+        print("FATAL ERROR: yt-dlp is not installed. Please run: pip install yt-dlp")
+        sys.exit(1)
 
     print(f"📁 Default download location: {get_default_download_path()}")
     
-    if args.web:
+    if web:
         print("🌐 Launching Web Server Mode at http://127.0.0.1:8000")
         print("Press Ctrl+C to stop the server.")
-        run_web_app()
+        run_web_app(concurrency)
     else:
         print("💻 Launching Terminal UI Mode...")
-        run_tui_app()
+        run_tui_app(concurrency)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file